@@ -3,59 +3,204 @@
 Script to build executable using PyInstaller
 """
 
+from __future__ import annotations
+
 import os
 import sys
-import shutil
+import argparse
 from pathlib import Path
 
-def build_executable():
-    """Build Windows executable"""
-    print("Building Visitor Management System executable...")
-    
-    # PyInstaller command
+APP_NAME = "VisitorManagementSystem"
+SPEC_FILE = Path(f"{APP_NAME}.spec")
+# Persistent PyInstaller cache so warm rebuilds reuse the analysis/bytecode cache
+CACHE_DIR = Path(".pyinstaller-cache")
+
+# Application sources (pre-compiled before each build)
+SOURCES = ["main.py", "database.py", "ui", "utils"]
+
+# Options baked into the generated .spec (and used directly for --onefile builds)
+BUILD_OPTIONS = [
+    "--windowed",
+    f"--name={APP_NAME}",
+    "--icon=logo.ico",  # Add icon if available
+    "--add-data=requirements.txt;.",
+    # Ship loose .pyc files instead of a zlib-compressed PYZ: no inflate per import at startup
+    "--noarchive",
+    "--hidden-import=PyQt5.sip",
+    # pandas loads the Excel writer by engine name, so the hooks cannot see it
+    "--hidden-import=openpyxl",
+    # Keep unused toolkits and test suites out of the bundle
+    "--exclude-module=tkinter",
+    "--exclude-module=matplotlib.tests",
+    "--exclude-module=pandas.tests",
+    "--exclude-module=numpy.tests",
+    "--exclude-module=PyQt5.QtWebEngine",
+    "--exclude-module=PyQt5.QtWebEngineCore",
+    "--exclude-module=PyQt5.QtWebEngineWidgets",
+]
+
+def build_with_nuitka():
+    """
+    Build an AOT-compiled standalone folder with Nuitka.
+    Requires a C compiler on PATH (MSVC or MinGW64) and the VC runtime on target machines.
+    """
+    print("Building Visitor Management System with Nuitka...")
+
     cmd = [
-        "pyinstaller",
-        "--onefile",
-        "--windowed",
-        "--name=VisitorManagementSystem",
-        "--icon=logo.ico",  # Add icon if available
-        "--add-data=requirements.txt;.",
-        "--hidden-import=PyQt5.sip",
-        "--hidden-import=pandas",
-        "--hidden-import=matplotlib",
-        "--hidden-import=openpyxl",
-        "--hidden-import=psutil",
-        "--hidden-import=cryptography",
+        sys.executable, "-m", "nuitka",
+        "--standalone",
+        "--assume-yes-for-downloads",
+        "--enable-plugin=pyqt5",
+        "--include-package=pandas",
+        "--include-package=matplotlib",
+        "--include-package=openpyxl",
+        "--include-data-dir=assets=assets",
+        "--windows-console-mode=disable",
+        "--windows-icon-from-ico=assets/logo.ico",
+        f"--output-filename={APP_NAME}",
+        "--output-dir=dist",
         "main.py"
     ]
-    
-    # Run PyInstaller
+
+    import subprocess
+    # Stream compiler output straight to the console (no pipe to fill up)
+    result = subprocess.run(cmd, stderr=subprocess.STDOUT)
+
+    if result.returncode == 0:
+        print("Build successful!")
+        print("Executable created in 'dist/main.dist' directory")
+        return True
+
+    print("Build failed! See the Nuitka output above.")
+    return False
+
+def build_executable(argv=None):
+    """Build Windows executable"""
+    parser = argparse.ArgumentParser(description="Build the Visitor Management System executable")
+    parser.add_argument(
+        "--onefile",
+        action="store_true",
+        help="build a single self-extracting exe (slower startup) instead of a folder"
+    )
+    parser.add_argument(
+        "--nuitka",
+        action="store_true",
+        help="compile with Nuitka instead of PyInstaller (needs a C compiler)"
+    )
+    parser.add_argument(
+        "--upx-dir",
+        default=os.environ.get("UPX_DIR"),
+        help="directory containing upx.exe to compress the bundled binaries (default: $UPX_DIR)"
+    )
+    parser.add_argument(
+        "--exec",
+        dest="exec_build",
+        action="store_true",
+        help="POSIX only: replace this process with PyInstaller (skips copying extra files and zipping); "
+             "ignored on Windows"
+    )
+    parser.add_argument(
+        "--regen-spec",
+        action="store_true",
+        help=f"regenerate {SPEC_FILE} (needed after changing BUILD_OPTIONS)"
+    )
+    args = parser.parse_args(argv)
+
+    if args.nuitka:
+        return build_with_nuitka()
+
+    print("Building Visitor Management System executable...")
+
     import subprocess
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    env = os.environ.copy()
+    env["PYINSTALLER_CONFIG_DIR"] = str(CACHE_DIR.resolve())
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    # Warm __pycache__ on all cores so PyInstaller's own compile step finds fresh .pyc files
+    subprocess.run(
+        [sys.executable, "-m", "compileall", "-q", "-j", "0", *SOURCES],
+        env=env,
+        check=False
+    )
+    
+    if args.onefile:
+        # Opt-in single exe: one-off command-line build
+        cmd = ["pyinstaller", "--noconfirm", "--onefile", *BUILD_OPTIONS, "main.py"]
+    else:
+        # One-folder build (no temp extraction on every launch) driven by a pinned .spec
+        if args.regen_spec or not SPEC_FILE.exists():
+            print(f"Generating {SPEC_FILE}...")
+            makespec = ["pyi-makespec", "--contents-directory=_internal", *BUILD_OPTIONS, "main.py"]
+            spec_result = subprocess.run(makespec, stderr=subprocess.STDOUT, env=env)
+            if spec_result.returncode != 0:
+                print("Spec generation failed! See the output above.")
+                return False
+        cmd = ["pyinstaller", "--noconfirm", "--distpath=dist", "--workpath=build", str(SPEC_FILE)]
+    if args.upx_dir:
+        cmd.insert(1, f"--upx-dir={args.upx_dir}")
+    
+    if args.exec_build:
+        if os.name == "nt":
+            # Windows has no real exec: os.execvpe spawns a child and exits, so the
+            # console returns mid-build. Run the normal (waiting) build instead.
+            print("--exec is POSIX-only; running a normal build.")
+        else:
+            # Hand the process over to PyInstaller; nothing after this line runs
+            sys.stdout.flush()
+            os.execvpe(cmd[0], cmd, env)
+
+    # Run PyInstaller, streaming its output straight to the console (no pipe to fill up)
+    result = subprocess.run(cmd, stderr=subprocess.STDOUT, env=env, close_fds=True)
     
     if result.returncode == 0:
         print("Build successful!")
         print("Executable created in 'dist' directory")
         
+        # Heavier imports only needed once a build has actually run
+        import shutil
+        from concurrent.futures import ThreadPoolExecutor
+
         # Create distribution package
         dist_dir = Path("dist")
         if dist_dir.exists():
             print("\nCreating distribution package...")
             
-            # Copy additional files
+            # Additional files shipped next to the executable
             files_to_copy = [
                 "README.md",
                 "requirements.txt"
             ]
+            files_to_copy = [Path(file) for file in files_to_copy if Path(file).exists()]
+            archive = dist_dir / f"{APP_NAME}.zip"
+
+            if args.onefile:
+                # Zip the freshly built exe plus the docs; never a stale one-folder build
+                exe = dist_dir / (f"{APP_NAME}.exe" if os.name == "nt" else APP_NAME)
+                import zipfile
+                with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+                    zf.write(exe, exe.name)
+                    for file in files_to_copy:
+                        zf.write(file, file.name)
+            else:
+                # Copy the docs into the one-folder build, then zip that folder
+                app_dir = dist_dir / APP_NAME
+
+                def copy_file(file):
+                    shutil.copy2(file, app_dir)
+
+                if len(files_to_copy) > 2:
+                    # Copy concurrently once the list is long enough to outweigh pool start-up
+                    with ThreadPoolExecutor(max_workers=4) as executor:
+                        list(executor.map(copy_file, files_to_copy))
+                else:
+                    for file in files_to_copy:
+                        copy_file(file)
+
+                shutil.make_archive(str(archive.with_suffix("")), "zip", str(dist_dir), APP_NAME)
             
-            for file in files_to_copy:
-                if Path(file).exists():
-                    shutil.copy2(file, dist_dir)
-            
-            print("Distribution package ready!")
+            print(f"Distribution package ready: {archive}")
     else:
-        print("Build failed!")
-        print("Error:", result.stderr)
+        print("Build failed! See the PyInstaller output above.")
         return False
     
     return True
@@ -4,36 +4,124 @@ import os
 import logging
 import uuid
 import re
+import atexit
+import functools
+import time
+import queue
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from collections import defaultdict
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Optional, Tuple, Any, Union
+from typing import Iterator, List, Dict, Optional, Set, Tuple, Any, Union
 from threading import Lock
+from concurrent.futures import Future
 
 
 # -------------------------
 # DEVICE IDENTIFIER
 # -------------------------
+@functools.lru_cache(maxsize=1)
 def get_device_mac() -> str:
-    """Return unique machine identifier (MAC-based). Hex uppercase format."""
+    """
+    Return unique machine identifier (MAC-based). Hex uppercase format.
+    Memoized: uuid.getnode() may enumerate interfaces or spawn a subprocess,
+    and the answer cannot change while the process runs.
+    """
     return hex(uuid.getnode()).upper()
 
 
 # -------------------------
 # REGEXP SUPPORT FOR SQLITE
 # -------------------------
+@functools.lru_cache(maxsize=64)
+def _compile_pattern(pattern: str) -> "re.Pattern":
+    return re.compile(pattern)
+
+
 def regexp(pattern: str, value: Optional[str]) -> bool:
     if value is None:
         return False
-    return re.match(pattern, value) is not None
+    return _compile_pattern(pattern).match(value) is not None
+
+
+# -------------------------
+# VALIDATOR PATTERNS (compiled once)
+# -------------------------
+_NRIC_RE = re.compile(r"[STFG][0-9]{7}[A-Z]")
+_HP_SEPARATORS = str.maketrans("", "", " -")
+
+
+def _canonical_hp(hp_no: str) -> str:
+    """HP number in its stored form: separators and a leading +65 country code dropped."""
+    hp_no = hp_no.strip().translate(_HP_SEPARATORS)
+    # only a complete 8-digit number loses its prefix; anything else is left
+    # as typed so validate_hp rejects it instead of storing a truncated number
+    for prefix in ("+65", "65"):
+        rest = hp_no[len(prefix):]
+        if hp_no.startswith(prefix) and len(rest) == 8 and rest.isdigit():
+            return rest
+    return hp_no
+
+
+# -------------------------
+# TIMESTAMP / DATE RANGE HELPERS
+# -------------------------
+# stored timestamp format; lexicographic order == chronological order
+_TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _now_str() -> str:
+    """Current local time in the stored format (time.strftime, no datetime object)."""
+    return time.strftime(_TS_FORMAT)
+
+
+def _day_range(start: Union[date, str], end: Union[date, str, None] = None) -> Tuple[str, str]:
+    """
+    Half-open bounds [start, end + 1 day) for range scans on check_in_time.
+    Stored timestamps are 'YYYY-MM-DD HH:MM:SS', so plain 'YYYY-MM-DD' strings
+    compare correctly against them and the raw-column index can be used.
+    """
+    if isinstance(start, str):
+        start = date.fromisoformat(start[:10])
+    if end is None:
+        end = start
+    elif isinstance(end, str):
+        end = date.fromisoformat(end[:10])
+    return start.isoformat(), (end + timedelta(days=1)).isoformat()
+
+
+def _parse_stored_date(s: str) -> date:
+    """Parse the 'YYYY-MM-DD' prefix of a stored timestamp (C-level fromisoformat, no strptime)."""
+    return date.fromisoformat(s[:10])
+
+
+def _escape_like(text: str) -> str:
+    """Escape LIKE wildcards in user input (used with ESCAPE '\\')."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _month_range(day: date) -> Tuple[str, str]:
+    """Half-open bounds [first of month, first of next month) for `day`."""
+    first = day.replace(day=1)
+    next_first = (first + timedelta(days=32)).replace(day=1)
+    return first.isoformat(), next_first.isoformat()
 
 
 # -------------------------
 # Lightweight in-memory cache
 # -------------------------
 class _SimpleCache:
+    """
+    TTL cache keyed as "<namespace>:<name>" (e.g. "active:all").
+    Expiry uses time.monotonic(); keys are indexed by namespace so
+    invalidate("active") drops them without scanning the whole store.
+    """
+
     def __init__(self, ttl_seconds: int = 5):
-        self._ttl = timedelta(seconds=ttl_seconds)
-        self._store: Dict[str, Tuple[datetime, Any]] = {}
+        self._ttl = float(ttl_seconds)
+        self._store: Dict[str, Tuple[float, Any]] = {}  # key -> (expires_at, value)
+        self._namespaces: Dict[str, Set[str]] = defaultdict(set)
         self._lock = Lock()
 
     def get(self, key: str):
@@ -41,30 +129,219 @@ class _SimpleCache:
             v = self._store.get(key)
             if not v:
                 return None
-            created, value = v
-            if datetime.now() - created > self._ttl:
+            expires_at, value = v
+            if time.monotonic() >= expires_at:
                 del self._store[key]
                 return None
             return value
 
     def set(self, key: str, value: Any):
         with self._lock:
-            self._store[key] = (datetime.now(), value)
+            self._store[key] = (time.monotonic() + self._ttl, value)
+            self._namespaces[key.split(":", 1)[0]].add(key)
 
     def invalidate(self, prefix: Optional[str] = None):
         with self._lock:
             if prefix is None:
                 self._store.clear()
+                self._namespaces.clear()
+            elif prefix in self._namespaces:
+                for k in self._namespaces.pop(prefix):
+                    self._store.pop(k, None)
             else:
                 keys = [k for k in self._store.keys() if k.startswith(prefix)]
                 for k in keys:
                     del self._store[k]
 
 
+# Applied once per new connection, in a single executescript() call;
+# journal_mode=WAL is switched on separately afterwards (see _enable_wal)
+_CONNECTION_PRAGMAS = """
+    PRAGMA auto_vacuum=INCREMENTAL;     -- only takes effect on a brand-new file; must precede WAL
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA foreign_keys=ON;
+    PRAGMA cache_size=-65536;           -- 64 MiB page cache
+    PRAGMA mmap_size=268435456;         -- 256 MiB memory-mapped reads
+    PRAGMA busy_timeout=5000;
+    PRAGMA wal_autocheckpoint=1000;
+    PRAGMA journal_size_limit=67108864; -- cap WAL file at 64 MiB
+"""
+
+# Bump when init_database() gains a one-time migration step or any DDL change
+# (table, trigger, index); databases already at this version skip the schema script
+_SCHEMA_VERSION = 3
+
+
+# -------------------------
+# SCHEMA
+# (idempotent DDL, run by init_database() as one script inside one transaction)
+# -------------------------
+_SCHEMA_TABLES_SQL = '''
+    CREATE TABLE IF NOT EXISTS visitors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nric TEXT,
+        hp_no TEXT,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        purpose TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        company TEXT,
+        vehicle_number TEXT,
+        pass_number TEXT,          -- Visit ID (kept as is, UI renames)
+        remarks TEXT,
+        person_visited TEXT NOT NULL,
+        organization TEXT,
+        check_in_time DATETIME NOT NULL,
+        check_out_time DATETIME,
+        duration INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        id_number TEXT             -- optional physical badge number (numeric in UI)
+    );
+
+    CREATE TABLE IF NOT EXISTS license (
+        id INTEGER PRIMARY KEY,
+        license_key TEXT NOT NULL,
+        device_mac TEXT NOT NULL,
+        activation_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_active INTEGER DEFAULT 1
+    );
+
+    -- Pre-aggregated check-ins per day ('YYYY-MM-DD'), kept current by triggers
+    -- so dashboard counts are key lookups instead of scans
+    CREATE TABLE IF NOT EXISTS daily_counts (
+        d TEXT PRIMARY KEY,
+        c INTEGER NOT NULL
+    );
+
+    -- Running SUM/COUNT of visit durations, kept current by triggers,
+    -- so the average duration is a two-row lookup instead of a full scan
+    CREATE TABLE IF NOT EXISTS stats (
+        k TEXT PRIMARY KEY,
+        v REAL NOT NULL
+    );
+'''
+
+# --- Migration 1: id_number column (new physical badge field) on pre-existing tables ---
+_MIGRATE_ID_NUMBER_SQL = '''
+    ALTER TABLE visitors ADD COLUMN id_number TEXT;
+'''
+
+# --- Migration 2: backfill daily_counts from existing visits ---
+_BACKFILL_DAILY_COUNTS_SQL = '''
+    DELETE FROM daily_counts;
+    INSERT INTO daily_counts (d, c)
+    SELECT substr(check_in_time, 1, 10), COUNT(*)
+    FROM visitors
+    GROUP BY 1;
+'''
+
+# --- Migration 3: backfill duration stats from existing visits ---
+_BACKFILL_STATS_SQL = '''
+    INSERT OR REPLACE INTO stats (k, v)
+    SELECT 'duration_sum', COALESCE(SUM(duration), 0) FROM visitors
+    UNION ALL
+    SELECT 'duration_count', COUNT(duration) FROM visitors;
+'''
+
+_SCHEMA_TRIGGERS_INDEXES_SQL = '''
+    CREATE TRIGGER IF NOT EXISTS trg_visitors_ai AFTER INSERT ON visitors
+    BEGIN
+        INSERT INTO daily_counts (d, c) VALUES (substr(NEW.check_in_time, 1, 10), 1)
+        ON CONFLICT(d) DO UPDATE SET c = c + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_visitors_ad AFTER DELETE ON visitors
+    BEGIN
+        UPDATE daily_counts SET c = c - 1 WHERE d = substr(OLD.check_in_time, 1, 10);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_visitors_duration_au
+    AFTER UPDATE OF duration ON visitors
+    WHEN NEW.duration IS NOT OLD.duration
+    BEGIN
+        UPDATE stats SET v = v + COALESCE(NEW.duration, 0) - COALESCE(OLD.duration, 0)
+        WHERE k = 'duration_sum';
+        UPDATE stats SET v = v + (NEW.duration IS NOT NULL) - (OLD.duration IS NOT NULL)
+        WHERE k = 'duration_count';
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_visitors_duration_ad
+    AFTER DELETE ON visitors
+    WHEN OLD.duration IS NOT NULL
+    BEGIN
+        UPDATE stats SET v = v - OLD.duration WHERE k = 'duration_sum';
+        UPDATE stats SET v = v - 1 WHERE k = 'duration_count';
+    END;
+
+    -- Indices for faster lookups
+    -- raw-column index: date filters are half-open range scans on check_in_time
+    DROP INDEX IF EXISTS idx_visitors_checkin;
+    CREATE INDEX IF NOT EXISTS idx_visitors_checkin_time ON visitors (check_in_time);
+    CREATE INDEX IF NOT EXISTS idx_visitors_nric ON visitors (nric);
+    CREATE INDEX IF NOT EXISTS idx_visitors_hp ON visitors (hp_no);
+    CREATE INDEX IF NOT EXISTS idx_visitors_pass ON visitors (pass_number);
+
+    -- Partial (checked-in only) indexes for the "already inside" check
+    CREATE INDEX IF NOT EXISTS idx_visitors_active_nric ON visitors (nric)
+    WHERE check_out_time IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_visitors_active_hp ON visitors (hp_no)
+    WHERE check_out_time IS NULL;
+
+    -- Partial covering index for get_active_visitors(): only checked-in rows,
+    -- every selected column, so the query never touches the table
+    -- (replaces the plain check_out_time index)
+    DROP INDEX IF EXISTS idx_visitors_checkout;
+    CREATE INDEX IF NOT EXISTS idx_visitors_active_cov
+    ON visitors (
+        check_in_time DESC, nric, hp_no, first_name, last_name,
+        category, purpose, destination, company, vehicle_number,
+        pass_number, id_number, person_visited, remarks, check_out_time
+    )
+    WHERE check_out_time IS NULL;
+'''
+
+
+# -------------------------
+# STATEMENTS
+# -------------------------
+_INSERT_VISITOR_SQL = '''
+    INSERT INTO visitors (
+        nric, hp_no, first_name, last_name, name, category,
+        purpose, destination, company, vehicle_number,
+        pass_number, id_number, remarks, person_visited,
+        organization, check_in_time
+    ) VALUES (
+        :nric, :hp_no, :first_name, :last_name, :name, :category,
+        :purpose, :destination, :company, :vehicle_number,
+        :pass_number, :id_number, :remarks, :person_visited,
+        :organization, :check_in_time
+    )
+'''
+
+# optional visitor columns bound as NULL when not supplied
+_OPTIONAL_VISITOR_FIELDS = (
+    "nric", "hp_no", "company", "vehicle_number", "pass_number",
+    "id_number", "remarks", "organization",
+)
+# NOT NULL columns a caller must supply (name is derived from first/last name)
+_REQUIRED_VISITOR_FIELDS = (
+    "first_name", "last_name", "category", "purpose", "destination", "person_visited",
+)
+
+# max writes coalesced into one transaction by the writer thread
+_WRITE_BATCH_MAX = 64
+
+
 class DatabaseManager:
     """
     Optimized SQLite manager:
       - PRAGMA tuning for better performance
+      - One persistent connection per thread (configured once, reused)
+      - Autocommit connections; writes use short explicit transactions (_txn)
+      - Visitor writes serialized through one writer thread (batched commits)
       - Centralized query helpers
       - Simple short-lived caching for read-heavy endpoints
       - Indexes created for frequently queried columns
@@ -81,8 +358,22 @@ class DatabaseManager:
             db_path = data_dir / "visitor_management.db"
 
         self.db_path = str(db_path)
+        self._device_mac = get_device_mac()
         self._conn_lock = Lock()
+        self._tls = threading.local()
+        # every open connection, keyed by the thread that owns it (see get_connection)
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        # single writer thread (started lazily) draining queued writes
+        self._write_q: "queue.Queue[Optional[Tuple[str, Any, Future]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
         self._cache = _SimpleCache(ttl_seconds=cache_ttl)
+        # in-memory Visit ID counter for the current day (see generate_pass_number)
+        self._pass_lock = Lock()
+        self._pass_date: Optional[str] = None
+        self._pass_counter = 0
+
+        # close pooled connections (and flush queued writes) at interpreter exit
+        atexit.register(self.close)
 
         # Ensure DB file exists and apply REGEXP function + PRAGMAs
         self._init_connection_environment()
@@ -98,157 +389,333 @@ class DatabaseManager:
     # -------------------------
     def get_connection(self) -> sqlite3.Connection:
         """
-        Return a new sqlite3.Connection configured with recommended pragmas.
-        Use short-lived connections (connect / close) to avoid concurrency issues.
+        Return this thread's sqlite3.Connection, creating and configuring it
+        (REGEXP + PRAGMAs) on first use. The connection is kept open and reused.
+        It runs in autocommit mode: reads need no transaction, writes go through
+        _txn() or the writer thread.
         """
+        conn = getattr(self._tls, "conn", None)
+        if conn is not None:
+            return conn
+
         conn = sqlite3.connect(
             self.db_path,
             timeout=5,
-            detect_types=sqlite3.PARSE_DECLTYPES
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            # autocommit: no implicit BEGIN; writes open their own short transaction via _txn()
+            isolation_level=None,
+            # compiled statements are cached per connection by SQL text; since the
+            # connection lives for the whole thread, every fixed query compiles once
+            cached_statements=256
         )
         conn.row_factory = sqlite3.Row
 
         # Register REGEXP function per-connection + performance PRAGMAs
         try:
-            conn.create_function("REGEXP", 2, regexp)
-            conn.execute("PRAGMA journal_mode=WAL;")
-            conn.execute("PRAGMA synchronous=NORMAL;")
-            conn.execute("PRAGMA temp_store=MEMORY;")
-            conn.execute("PRAGMA foreign_keys=ON;")
+            try:
+                # deterministic lets SQLite hoist/factor the call out of per-row evaluation
+                conn.create_function("REGEXP", 2, regexp, deterministic=True)
+            except (TypeError, sqlite3.NotSupportedError):
+                # SQLite < 3.8.3 has no deterministic flag
+                conn.create_function("REGEXP", 2, regexp)
+            conn.executescript(_CONNECTION_PRAGMAS)
         except Exception:
             # If any pragma fails, we still keep working with defaults
             logging.exception("Failed to apply PRAGMA on new connection")
-
+        self._enable_wal(conn)
+
+        with self._conn_lock:
+            # drop connections left behind by threads that have since finished
+            dead = [t for t in self._connections if not t.is_alive()]
+            stale = [self._connections.pop(t) for t in dead]
+            self._connections[threading.current_thread()] = conn
+        for old_conn in stale:
+            try:
+                old_conn.close()
+            except sqlite3.Error:
+                logging.exception("Failed to close DB connection of finished thread")
+        self._tls.conn = conn
         return conn
 
+    @staticmethod
+    def _enable_wal(conn: sqlite3.Connection):
+        """
+        Switch to WAL. SQLite keeps the old mode when WAL is unavailable
+        (e.g. the DB sits on a network share); fall back to synchronous=FULL
+        there, since NORMAL is only crash-safe in WAL mode.
+        """
+        try:
+            mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        except sqlite3.Error:
+            logging.exception("Failed to enable WAL journal mode")
+            mode = None
+        if str(mode).lower() != "wal":
+            logging.warning("WAL unavailable (journal_mode=%s); using rollback journal", mode)
+            try:
+                conn.execute("PRAGMA synchronous=FULL")
+            except sqlite3.Error:
+                logging.exception("Failed to apply synchronous=FULL")
+
+    def close(self):
+        """Flush pending writes and close every pooled connection (called automatically at exit)."""
+        self._stop_writer()
+        with self._conn_lock:
+            conns, self._connections = list(self._connections.values()), {}
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                logging.exception("Failed to close DB connection")
+        # connections of other threads are closed too; force them to reconnect
+        self._tls = threading.local()
+
+    @contextmanager
+    def _txn(self):
+        """
+        BEGIN IMMEDIATE ... COMMIT around the block (ROLLBACK on error).
+        Keep only the actual statements inside so the write lock is held briefly.
+        """
+        conn = self.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # a failed COMMIT leaves the transaction (and its RESERVED lock) open;
+            # SQLite may also have rolled back by itself already
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    logging.exception("ROLLBACK failed")
+            raise
+
     def _init_connection_environment(self):
-        # ensure DB file is reachable and create one connection to initialize PRAGMAs
+        # ensure DB file is reachable and open this thread's connection (applies PRAGMAs)
         try:
-            conn = self.get_connection()
-            conn.close()
+            self.get_connection()
         except Exception:
             logging.exception("Failed to initialize DB connection environment")
 
     # -------------------------
-    # central query helpers
-    # (accept params either as tuple/list OR as dict for named params)
+    # central read helpers
+    # (accept params either as tuple/list OR as dict for named params;
+    #  autocommit reads, so they never commit or end an enclosing _txn)
     # -------------------------
     def _fetchall(self, query: str, params: Union[Tuple, Dict, List] = ()) -> List[sqlite3.Row]:
         try:
-            with self.get_connection() as conn:
-                cur = conn.execute(query, params)
-                rows = cur.fetchall()
-                return rows
+            return self.get_connection().execute(query, params).fetchall()
         except sqlite3.Error:
             logging.exception("Query failed: %s params=%s", query, params)
             return []
 
-    def _fetchone(self, query: str, params: Union[Tuple, Dict, List] = ()):
+    def _fetchall_dict(self, query: str, params: Union[Tuple, Dict, List] = ()) -> List[Dict]:
+        """Like _fetchall but returns plain dicts, built from raw tuples with the column names read once."""
         try:
-            with self.get_connection() as conn:
-                cur = conn.execute(query, params)
-                return cur.fetchone()
+            cur = self.get_connection().execute(query, params)
+            cur.row_factory = None  # plain tuples; skip building sqlite3.Row objects
+            cols = [d[0] for d in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
         except sqlite3.Error:
             logging.exception("Query failed: %s params=%s", query, params)
-            return None
+            return []
 
-    def _execute(self, query: str, params: Union[Tuple, Dict, List] = ()):
+    def _iter_dicts(
+        self,
+        query: str,
+        params: Union[Tuple, Dict, List] = (),
+        chunk_size: int = 1024
+    ) -> Iterator[Dict]:
+        """Like _fetchall_dict but lazy: yields dicts while pulling `chunk_size` rows per fetchmany()."""
+        try:
+            cur = self.get_connection().execute(query, params)
+            cur.row_factory = None  # plain tuples, zipped with the column names below
+            cur.arraysize = chunk_size
+            cols = [d[0] for d in cur.description]
+            while True:
+                chunk = cur.fetchmany()
+                if not chunk:
+                    break
+                for row in chunk:
+                    yield dict(zip(cols, row))
+        except sqlite3.Error:
+            logging.exception("Query failed: %s params=%s", query, params)
+
+    def _fetchone(self, query: str, params: Union[Tuple, Dict, List] = ()):
         try:
-            with self.get_connection() as conn:
-                cur = conn.execute(query, params)
-                conn.commit()
-                return cur
+            return self.get_connection().execute(query, params).fetchone()
         except sqlite3.Error:
-            logging.exception("Execution failed: %s params=%s", query, params)
+            logging.exception("Query failed: %s params=%s", query, params)
             return None
 
+    # -------------------------
+    # write serializer
+    # (one thread owns all queued writes and commits them in batches)
+    # -------------------------
+    def _submit_write(self, query: str, params: Union[Tuple, Dict, List] = ()) -> Future:
+        """
+        Queue a write for the writer thread. The returned Future resolves to
+        the statement's rowcount once committed, or raises its sqlite3.Error.
+        """
+        with self._conn_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._writer_loop, name="vms-db-writer", daemon=True
+                )
+                self._writer.start()
+        fut: Future = Future()
+        self._write_q.put((query, params, fut))
+        return fut
+
+    def _finish_write(self, fut: Future, prefixes: Tuple[str, ...], wait: bool) -> Optional[int]:
+        """
+        Invalidate cache prefixes once `fut` is committed. With wait=True this
+        blocks and returns the rowcount; with wait=False it returns None at once.
+        """
+        def invalidate(_f=None):
+            for prefix in prefixes:
+                self._cache.invalidate(prefix=prefix)
+
+        if wait:
+            rowcount = fut.result()  # re-raises sqlite3.Error from the writer
+            invalidate()
+            return rowcount
+        fut.add_done_callback(invalidate)
+        return None
+
+    def _writer_loop(self):
+        while True:
+            item = self._write_q.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            # coalesce whatever is already queued into the same transaction
+            while len(batch) < _WRITE_BATCH_MAX:
+                try:
+                    nxt = self._write_q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._apply_write_batch(batch)
+            if stop:
+                return
+
+    def _apply_write_batch(self, batch: List[Tuple[str, Any, Future]]):
+        outcomes = []
+        try:
+            with self._txn() as conn:
+                for query, params, fut in batch:
+                    # savepoint per write so one failing statement doesn't sink the batch
+                    conn.execute("SAVEPOINT queued_write")
+                    try:
+                        cur = conn.execute(query, params)
+                        outcomes.append((fut, cur.rowcount, None))
+                    except sqlite3.Error as e:
+                        logging.error("Queued write failed: %s params=%s (%s)", query, params, e)
+                        conn.execute("ROLLBACK TO queued_write")
+                        outcomes.append((fut, None, e))
+                    conn.execute("RELEASE queued_write")
+        except sqlite3.Error as e:
+            logging.exception("Write batch of %d statement(s) failed", len(batch))
+            for _, _, fut in batch:
+                fut.set_exception(e)
+            return
+
+        for fut, rowcount, error in outcomes:
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(rowcount)
+
+    def _stop_writer(self):
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._write_q.put(None)
+            writer.join()
+        self._writer = None
+
     # -------------------------
     # schema / indices
     # -------------------------
     def init_database(self):
+        conn = None
         try:
-            with self.get_connection() as conn:
-                cur = conn.cursor()
-
-                # Base schema (original)
-                cur.execute('''
-                    CREATE TABLE IF NOT EXISTS visitors (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        nric TEXT,
-                        hp_no TEXT,
-                        first_name TEXT NOT NULL,
-                        last_name TEXT NOT NULL,
-                        name TEXT NOT NULL,
-                        category TEXT NOT NULL,
-                        purpose TEXT NOT NULL,
-                        destination TEXT NOT NULL,
-                        company TEXT,
-                        vehicle_number TEXT,
-                        pass_number TEXT,          -- Visit ID (kept as is, UI renames)
-                        remarks TEXT,
-                        person_visited TEXT NOT NULL,
-                        organization TEXT,
-                        check_in_time DATETIME NOT NULL,
-                        check_out_time DATETIME,
-                        duration INTEGER,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                # --- Migration: ensure id_number column exists (new physical badge field) ---
-                cur.execute("PRAGMA table_info(visitors)")
-                cols = [row["name"] for row in cur.fetchall()]
-                if "id_number" not in cols:
-                    # optional physical badge number; stored as TEXT but expected to be numeric in UI
-                    cur.execute("ALTER TABLE visitors ADD COLUMN id_number TEXT")
-
-                cur.execute('''
-                    CREATE TABLE IF NOT EXISTS license (
-                        id INTEGER PRIMARY KEY,
-                        license_key TEXT NOT NULL,
-                        device_mac TEXT NOT NULL,
-                        activation_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        is_active INTEGER DEFAULT 1
-                    )
-                ''')
-
-                # Indices for faster lookups
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_visitors_checkin ON visitors (DATE(check_in_time));")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_visitors_nric ON visitors (nric);")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_visitors_hp ON visitors (hp_no);")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_visitors_checkout ON visitors (check_out_time);")
-                cur.execute("CREATE INDEX IF NOT EXISTS idx_visitors_pass ON visitors (pass_number);")
+            conn = self.get_connection()
+            # Schema version (PRAGMA user_version) gates one-time migrations/backfills
+            schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version >= _SCHEMA_VERSION:
+                # schema current: no DDL transaction. PRAGMA optimize only runs ANALYZE
+                # (a short write to sqlite_stat1) when SQLite judges the stats stale;
+                # on most starts it writes nothing
+                conn.execute("PRAGMA analysis_limit=1000;")
+                conn.execute("PRAGMA optimize;")
+                return
 
-                conn.commit()
-                logging.info("Database schema & indices ensured")
+            existing_cols = {r["name"] for r in conn.execute("PRAGMA table_info(visitors)")}
+
+            # one script, one transaction: all DDL is parsed in a single call
+            # and a failed migration leaves the schema untouched
+            script = ["BEGIN IMMEDIATE;", _SCHEMA_TABLES_SQL]
+            if existing_cols and "id_number" not in existing_cols:
+                script.append(_MIGRATE_ID_NUMBER_SQL)
+            if schema_version < 2:
+                script.append(_BACKFILL_DAILY_COUNTS_SQL)
+            if schema_version < 3:
+                script.append(_BACKFILL_STATS_SQL)
+            script.append(_SCHEMA_TRIGGERS_INDEXES_SQL)
+            script.append(f"PRAGMA user_version = {_SCHEMA_VERSION};")
+            script.append("COMMIT;")
+            conn.executescript("\n".join(script))
+
+            # refresh planner statistics (bounded sampling keeps this cheap on large DBs)
+            conn.execute("PRAGMA analysis_limit=1000;")
+            conn.execute("ANALYZE;")
+            logging.info("Database schema & indices ensured")
         except sqlite3.Error:
+            if conn is not None and conn.in_transaction:
+                conn.execute("ROLLBACK")
             logging.exception("Database initialization error")
 
     # -------------------------
     # DEVICE PROTECTION (unchanged logic; strict)
     # -------------------------
     def _verify_device_identity(self):
-        current_mac = get_device_mac()
+        current_mac = self._device_mac
+        rebound = False
         try:
-            row = self._fetchone("SELECT device_mac FROM license WHERE id = 1")
-            if not row:
-                # first run: create license placeholder with this device mac (empty key)
-                self._execute(
-                    "INSERT OR REPLACE INTO license (id, license_key, device_mac, is_active) "
-                    "VALUES (1, ?, ?, 0)",
-                    ("", current_mac)
-                )
-                return
+            # single connection + transaction: the wipe and the rebind commit together
+            with self._txn() as conn:
+                row = conn.execute("SELECT device_mac FROM license WHERE id = 1").fetchone()
+                if not row:
+                    # first run: create license placeholder with this device mac (empty key)
+                    conn.execute(
+                        "INSERT INTO license (id, license_key, device_mac, is_active) "
+                        "VALUES (1, ?, ?, 0) ON CONFLICT(id) DO NOTHING",
+                        ("", current_mac)
+                    )
+                    return
+
+                if row["device_mac"] != current_mac:
+                    logging.warning("Database appears to have been copied from another machine. Clearing visitor logs.")
+                    # wipe visitor logs (audit policy), update device mac
+                    conn.execute("DELETE FROM visitors")
+                    conn.execute("DELETE FROM daily_counts")
+                    conn.execute("UPDATE license SET device_mac=? WHERE id=1", (current_mac,))
+                    rebound = True
 
-            stored_mac = row["device_mac"] if isinstance(row, sqlite3.Row) and "device_mac" in row else row[0]
-            if stored_mac != current_mac:
-                logging.warning("Database appears to have been copied from another machine. Clearing visitor logs.")
-                # wipe visitor logs (audit policy), update device mac
-                self._execute("DELETE FROM visitors")
-                self._execute("UPDATE license SET device_mac=? WHERE id=1", (current_mac,))
+            if rebound:
                 logging.info("DB now bound to this device (mac updated)")
+                # return the wiped pages to the filesystem (no-op unless auto_vacuum=INCREMENTAL);
+                # executescript steps the pragma to completion, execute() frees a single page
+                self.get_connection().executescript("PRAGMA incremental_vacuum;")
                 # invalidate caches
                 self._cache.invalidate()
+                self._reset_pass_counter()
         except Exception:
             logging.exception("Device identity verification failed")
 
@@ -257,7 +724,7 @@ class DatabaseManager:
     # -------------------------
     @staticmethod
     def validate_nric(nric: str) -> bool:
-        return bool(re.match(r"^[STFG][0-9]{7}[A-Z]$", nric.upper()))
+        return _NRIC_RE.fullmatch(nric.upper()) is not None
 
     @staticmethod
     def validate_hp(hp_no: str) -> bool:
@@ -275,26 +742,22 @@ class DatabaseManager:
         if not nric and not hp_no:
             return False
 
-        clauses = []
+        # one EXISTS probe per identifier, each answered from its own
+        # partial (active-only) index without touching past visits
+        probes = []
         params: List[Any] = []
 
         if nric:
-            clauses.append("nric = ?")
+            probes.append("EXISTS (SELECT 1 FROM visitors WHERE nric = ? AND check_out_time IS NULL)")
             params.append(nric.upper())
         if hp_no:
-            clauses.append("hp_no = ?")
-            params.append(hp_no)
+            probes.append("EXISTS (SELECT 1 FROM visitors WHERE hp_no = ? AND check_out_time IS NULL)")
+            params.append(_canonical_hp(hp_no))
 
-        where_id = " OR ".join(clauses)
-        query = f"""
-            SELECT 1
-            FROM visitors
-            WHERE ({where_id}) AND check_out_time IS NULL
-            LIMIT 1
-        """
+        query = f"SELECT {' OR '.join(probes)} AS active"
 
         row = self._fetchone(query, tuple(params))
-        return bool(row)
+        return bool(row and row["active"])
 
     def get_most_recent_visit_for_autofill(
         self,
@@ -309,12 +772,20 @@ class DatabaseManager:
         if not nric and not hp_no:
             return None
 
+        nric = (nric or "").upper()
+        hp_no = _canonical_hp(hp_no) if hp_no else ""
+        # repeat searches for the same visitor skip the query; checkout invalidates
+        cache_key = f"autofill:{nric}|{hp_no}"
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         clauses = []
         params: List[Any] = []
 
         if nric:
             clauses.append("nric = ?")
-            params.append(nric.upper())
+            params.append(nric)
         if hp_no:
             clauses.append("hp_no = ?")
             params.append(hp_no)
@@ -344,7 +815,7 @@ class DatabaseManager:
         if not row:
             return None
 
-        return {
+        profile = {
             "nric": row["nric"] or "",
             "hp_no": row["hp_no"] or "",
             "first_name": row["first_name"] or "",
@@ -356,104 +827,149 @@ class DatabaseManager:
             "person_visited": row["person_visited"] or "",
             "last_visit": row["last_visit"],
         }
+        self._cache.set(cache_key, profile)
+        return profile
 
     # -------------------------
     # WRITE OPERATIONS (invalidate caches on success)
     # -------------------------
-    def add_visitor(self, **kwargs) -> bool:
+    def add_visitor(self, wait: bool = True, **kwargs) -> bool:
         """
         Add visitor. Accepts same kwargs as before plus optional id_number.
         On success: invalidate caches relevant to active visitors and counts.
+        The insert goes through the writer thread; wait=False returns as soon
+        as it is queued (failures are then only logged).
         """
         try:
-            if kwargs.get("nric"):
-                kwargs["nric"] = kwargs["nric"].upper()
-                if not self.validate_nric(kwargs["nric"]):
-                    logging.debug("Invalid NRIC format when adding visitor")
-                    return False
-
-            if kwargs.get("hp_no") and not self.validate_hp(kwargs["hp_no"]):
-                logging.debug("Invalid HP format when adding visitor")
+            kwargs, problem = self._prepare_visitor_row(kwargs)
+            if kwargs is None:
+                logging.debug("Rejected visitor: %s", problem)
                 return False
 
-            if not kwargs.get("name"):
-                fn = kwargs.get("first_name", "")
-                ln = kwargs.get("last_name", "")
-                kwargs["name"] = f"{fn} {ln}".strip()
-
-            # ensure check_in_time string
-            kwargs["check_in_time"] = kwargs.get("check_in_time") or datetime.now()
-            if isinstance(kwargs["check_in_time"], datetime):
-                kwargs["check_in_time"] = kwargs["check_in_time"].strftime('%Y-%m-%d %H:%M:%S')
-
-            # optional physical badge number
-            kwargs.setdefault("id_number", None)
-
-            query = '''
-                INSERT INTO visitors (
-                    nric, hp_no, first_name, last_name, name, category,
-                    purpose, destination, company, vehicle_number,
-                    pass_number, id_number, remarks, person_visited,
-                    organization, check_in_time
-                ) VALUES (
-                    :nric, :hp_no, :first_name, :last_name, :name, :category,
-                    :purpose, :destination, :company, :vehicle_number,
-                    :pass_number, :id_number, :remarks, :person_visited,
-                    :organization, :check_in_time
-                )
-            '''
-
             # Execute with named parameters dict (sqlite accepts dict for :name style)
-            with self.get_connection() as conn:
-                cur = conn.cursor()
-                cur.execute(query, kwargs)
-                conn.commit()
-
-            # invalidate relevant caches
-            self._cache.invalidate(prefix="active")
-            self._cache.invalidate(prefix="counts")
+            self._claim_pass_number(kwargs.get("pass_number"))
+            fut = self._submit_write(_INSERT_VISITOR_SQL, kwargs)
+            if not wait:
+                # queued insert failing later must not leave a gap in Visit IDs
+                fut.add_done_callback(self._reset_pass_counter)
+
+            # invalidate relevant caches once committed
+            self._finish_write(fut, ("active", "counts"), wait)
             return True
         except sqlite3.Error:
             logging.exception("Error adding visitor (sqlite error)")
+            self._reset_pass_counter()
             return False
         except Exception:
             logging.exception("Unexpected error in add_visitor")
+            self._reset_pass_counter()
             return False
 
-    def checkout_visitor(self, visitor_id: int) -> bool:
+    def add_visitors_bulk(self, rows: List[Dict]) -> Tuple[int, List[Tuple[int, str]]]:
         """
-        Set check_out_time and duration. On success, invalidate caches.
+        Insert many visitors (e.g. an import) with one executemany in a single
+        transaction. Rows take the same keys as add_visitor(); invalid rows are
+        skipped. Returns (inserted, rejected) where rejected lists
+        (row index, reason) for every skipped row.
         """
-        try:
-            checkout_time = datetime.now()
-            row = self._fetchone(
-                "SELECT check_in_time FROM visitors WHERE id = ?",
-                (visitor_id,)
+        prepared = []
+        rejected = []
+        for i, row in enumerate(rows):
+            values, problem = self._prepare_visitor_row(dict(row))
+            if values is not None:
+                prepared.append(values)
+            else:
+                rejected.append((i, problem))
+        if rejected:
+            logging.warning(
+                "add_visitors_bulk skipped %d invalid rows at %s%s",
+                len(rejected), [i for i, _ in rejected[:20]], " ..." if len(rejected) > 20 else ""
             )
-            if not row:
-                logging.debug("Checkout attempted for non-existing visitor id=%s", visitor_id)
-                return False
+        if not prepared:
+            return 0, rejected
 
-            check_in_str = row["check_in_time"] if isinstance(row, sqlite3.Row) else row[0]
-            # support both isoformat and our stored format
+        conn = self.get_connection()
+        try:
+            # keep a large batch in the page cache instead of spilling mid-transaction
+            conn.execute("PRAGMA cache_spill=false;")
+            with self._txn():
+                conn.executemany(_INSERT_VISITOR_SQL, prepared)
+        except sqlite3.Error:
+            logging.exception("add_visitors_bulk failed (%d rows)", len(prepared))
+            return 0, rejected
+        finally:
             try:
-                check_in_dt = datetime.fromisoformat(check_in_str)
-            except Exception:
-                check_in_dt = datetime.strptime(check_in_str, '%Y-%m-%d %H:%M:%S')
-
-            duration_minutes = int((checkout_time - check_in_dt).total_seconds() // 60)
-            self._execute(
+                conn.execute("PRAGMA cache_spill=true;")
+            except sqlite3.Error:
+                logging.exception("Failed to re-enable cache_spill")
+
+        for values in prepared:
+            self._claim_pass_number(values.get("pass_number"))
+        self._cache.invalidate(prefix="active")
+        self._cache.invalidate(prefix="history")
+        self._cache.invalidate(prefix="counts")
+        return len(prepared), rejected
+
+    def _prepare_visitor_row(self, values: Dict) -> Tuple[Optional[Dict], str]:
+        """
+        Validate and fill defaults for one visitor insert.
+        Returns (values, "") or (None, reason) if the row is invalid.
+        """
+        missing = [f for f in _REQUIRED_VISITOR_FIELDS if values.get(f) is None]
+        if missing:
+            return None, f"missing required fields: {', '.join(missing)}"
+
+        if values.get("nric"):
+            values["nric"] = values["nric"].upper()
+            if not self.validate_nric(values["nric"]):
+                return None, "invalid NRIC format"
+
+        if values.get("hp_no"):
+            values["hp_no"] = _canonical_hp(values["hp_no"])
+            if not self.validate_hp(values["hp_no"]):
+                return None, "invalid HP format"
+
+        if not values.get("name"):
+            fn = values.get("first_name", "")
+            ln = values.get("last_name", "")
+            values["name"] = f"{fn} {ln}".strip()
+
+        # ensure check_in_time string
+        check_in = values.get("check_in_time")
+        if not check_in:
+            values["check_in_time"] = _now_str()
+        elif isinstance(check_in, datetime):
+            values["check_in_time"] = check_in.strftime(_TS_FORMAT)
+
+        # optional columns (incl. physical badge number id_number)
+        for field in _OPTIONAL_VISITOR_FIELDS:
+            values.setdefault(field, None)
+        return values, ""
+
+    def checkout_visitor(self, visitor_id: int, wait: bool = True) -> bool:
+        """
+        Set check_out_time and duration (whole minutes, computed in SQL) in a
+        single UPDATE. On success, invalidate caches.
+        The update goes through the writer thread; wait=False returns as soon
+        as it is queued.
+        """
+        try:
+            checkout_str = _now_str()
+            fut = self._submit_write(
                 '''
                 UPDATE visitors
-                SET check_out_time = ?, duration = ?
-                WHERE id = ?
+                SET check_out_time = ?,
+                    duration = (CAST(strftime('%s', ?) AS INTEGER)
+                                - CAST(strftime('%s', check_in_time) AS INTEGER)) / 60
+                WHERE id = ? AND check_out_time IS NULL
                 ''',
-                (checkout_time.strftime('%Y-%m-%d %H:%M:%S'), duration_minutes, visitor_id)
+                (checkout_str, checkout_str, visitor_id)
             )
 
-            self._cache.invalidate(prefix="active")
-            self._cache.invalidate(prefix="history")
-            self._cache.invalidate(prefix="counts")
+            rowcount = self._finish_write(fut, ("active", "history", "counts", "autofill"), wait)
+            if wait and rowcount != 1:
+                logging.debug("Checkout attempted for non-existing or checked-out visitor id=%s", visitor_id)
+                return False
             return True
         except sqlite3.Error:
             logging.exception("checkout_visitor failed")
@@ -466,18 +982,46 @@ class DatabaseManager:
         """
         Generates the Visit ID (previously called pass number).
         Format kept as: VMS-YYYYMMDD-XXXX
+        The next number is max(today's daily_counts row, last number used by this
+        process) + 1. Nothing is consumed here: add_visitor() advances the
+        in-memory counter once the row is queued and re-seeds it if the insert
+        fails, so failed check-ins never leave gaps.
         """
         try:
-            today = datetime.now().strftime('%Y%m%d')
-            # Use today's count but avoid expensive full scans; indexed by check_in_time
+            now = time.localtime()
+            today = time.strftime('%Y%m%d', now)
+            # one primary-key probe; also picks up rows written by another instance
             row = self._fetchone(
-                "SELECT COUNT(*) as c FROM visitors WHERE DATE(check_in_time)=DATE('now')"
+                "SELECT c FROM daily_counts WHERE d = ?",
+                (time.strftime('%Y-%m-%d', now),)
             )
-            count = row["c"] if row else 0
-            return f"VMS-{today}-{count + 1:04d}"
+            seeded = row["c"] if row else 0
+            with self._pass_lock:
+                used = self._pass_counter if self._pass_date == today else 0
+                count = max(seeded, used) + 1
+            return f"VMS-{today}-{count:04d}"
         except Exception:
             logging.exception("generate_pass_number fallback")
-            return f"VMS-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            return f"VMS-{time.strftime('%Y%m%d-%H%M%S')}"
+
+    def _claim_pass_number(self, pass_number: Optional[str]):
+        """Advance the in-memory counter past a Visit ID that is about to be inserted."""
+        parts = (pass_number or "").split("-")
+        if len(parts) != 3 or parts[0] != "VMS" or len(parts[2]) != 4 or not parts[2].isdigit():
+            return  # not a generated VMS-YYYYMMDD-XXXX id (e.g. the timestamp fallback)
+        day, seq = parts[1], int(parts[2])
+        with self._pass_lock:
+            if self._pass_date != day:
+                self._pass_date, self._pass_counter = day, 0
+            self._pass_counter = max(self._pass_counter, seq)
+
+    def _reset_pass_counter(self, _f: Optional[Future] = None):
+        """Forget the in-memory counter; the next Visit ID is re-seeded from daily_counts."""
+        if _f is not None and _f.exception() is None:
+            return
+        with self._pass_lock:
+            self._pass_date = None
+            self._pass_counter = 0
 
     # -------------------------
     # READ / SEARCH operations (with caching where useful)
@@ -510,7 +1054,7 @@ class DatabaseManager:
             return cached
 
         try:
-            rows = self._fetchall(
+            result = self._fetchall_dict(
                 '''
                 SELECT
                     id, nric, hp_no, first_name, last_name, category,
@@ -522,7 +1066,6 @@ class DatabaseManager:
                 ORDER BY check_in_time DESC
                 '''
             )
-            result = [dict(r) for r in rows]
             self._cache.set("active:all", result)
             return result
         except sqlite3.Error:
@@ -534,8 +1077,7 @@ class DatabaseManager:
         if cached is not None:
             return cached
         try:
-            today = date.today().strftime("%Y-%m-%d")
-            rows = self._fetchall(
+            result = self._fetchall_dict(
                 '''
                 SELECT
                     name, first_name, last_name, nric, hp_no, category,
@@ -543,95 +1085,123 @@ class DatabaseManager:
                     destination, pass_number, id_number,
                     check_in_time, check_out_time, duration
                 FROM visitors
-                WHERE DATE(check_in_time) = ?
+                WHERE check_in_time >= ? AND check_in_time < ?
                 ORDER BY check_in_time DESC
                 ''',
-                (today,)
+                _day_range(date.today())
             )
-            result = [dict(r) for r in rows]
             self._cache.set("history:today", result)
             return result
         except sqlite3.Error:
             logging.exception("get_todays_history failed")
             return []
 
+    def iter_all_records(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        chunk_size: int = 1024,
+        organization: str = "",
+        hp_no: str = "",
+        person_visited: str = ""
+    ) -> Iterator[Dict]:
+        """
+        Yield visitor records (newest first) as dicts, fetching `chunk_size`
+        rows at a time so large exports never hold the whole table in memory.
+        Text filters are case-insensitive substring matches, evaluated by SQLite
+        inside the (indexed) date range.
+        """
+        clauses = []
+        params: List[Any] = []
+        if start_date and end_date:
+            clauses.append("check_in_time >= ? AND check_in_time < ?")
+            params.extend(_day_range(start_date, end_date))
+        for column, text in (("company", organization), ("hp_no", hp_no), ("person_visited", person_visited)):
+            if text:
+                clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(f"%{_escape_like(text)}%")
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f'''
+            SELECT * FROM visitors
+            {where}
+            ORDER BY check_in_time DESC
+        '''
+        return self._iter_dicts(query, tuple(params), chunk_size)
+
     def get_all_records(
         self,
         start_date: Optional[date] = None,
-        end_date: Optional[date] = None
+        end_date: Optional[date] = None,
+        organization: str = "",
+        hp_no: str = "",
+        person_visited: str = ""
     ) -> List[Dict]:
-        try:
-            if start_date and end_date:
-                rows = self._fetchall(
-                    '''
-                    SELECT * FROM visitors
-                    WHERE DATE(check_in_time) BETWEEN ? AND ?
-                    ORDER BY check_in_time DESC
-                    ''',
-                    (start_date, end_date)
-                )
-            else:
-                rows = self._fetchall(
-                    '''
-                    SELECT * FROM visitors
-                    ORDER BY check_in_time DESC
-                    '''
-                )
-            return [dict(r) for r in rows]
-        except sqlite3.Error:
-            logging.exception("get_all_records failed")
-            return []
+        return list(self.iter_all_records(
+            start_date, end_date,
+            organization=organization, hp_no=hp_no, person_visited=person_visited
+        ))
 
     def get_daily_checkins_current_month(self) -> List[Tuple[date, int]]:
+        cached = self._cache.get("counts:month")
+        if cached is not None:
+            return cached
         try:
             rows = self._fetchall(
                 '''
-                SELECT DATE(check_in_time) as d, COUNT(*) as c
-                FROM visitors
-                WHERE strftime('%Y-%m', check_in_time) = strftime('%Y-%m', 'now')
-                GROUP BY DATE(check_in_time)
-                ORDER BY DATE(check_in_time)
-                '''
+                SELECT d, c
+                FROM daily_counts
+                WHERE d >= ? AND d < ? AND c > 0
+                ORDER BY d
+                ''',
+                _month_range(date.today())
             )
-            return [
-                (datetime.strptime(r["d"], '%Y-%m-%d').date(), r["c"])
+            result = [
+                (_parse_stored_date(r["d"]), r["c"])
                 for r in rows
             ]
+            self._cache.set("counts:month", result)
+            return result
         except sqlite3.Error:
             logging.exception("get_daily_checkins_current_month failed")
             return []
 
-    def get_todays_checkin_count(self) -> int:
-        cached = self._cache.get("counts:today")
+    def get_dashboard_stats(self) -> Dict[str, Any]:
+        """
+        Today's check-in count and the average visit duration (minutes),
+        read from daily_counts/stats in a single round-trip.
+        """
+        cached = self._cache.get("counts:dashboard")
         if cached is not None:
             return cached
         try:
-            today = date.today().strftime("%Y-%m-%d")
             row = self._fetchone(
-                "SELECT COUNT(*) as c FROM visitors WHERE DATE(check_in_time)=?",
-                (today,)
+                '''
+                SELECT
+                    (SELECT c FROM daily_counts WHERE d = ?) AS today_count,
+                    (SELECT v FROM stats WHERE k = 'duration_sum') AS duration_sum,
+                    (SELECT v FROM stats WHERE k = 'duration_count') AS duration_count
+                ''',
+                (date.today().isoformat(),)
             )
-            count = row["c"] if row else 0
-            self._cache.set("counts:today", count)
-            return count
+            if row is None:
+                return {"today_count": 0, "avg_duration": 0.0}
+            count = row["duration_count"] or 0
+            stats = {
+                "today_count": row["today_count"] or 0,
+                "avg_duration": float(row["duration_sum"] or 0.0) / count if count > 0 else 0.0,
+            }
+            self._cache.set("counts:dashboard", stats)
+            return stats
         except sqlite3.Error:
-            logging.exception("get_todays_checkin_count failed")
-            return 0
+            logging.exception("get_dashboard_stats failed")
+            return {"today_count": 0, "avg_duration": 0.0}
+
+    def get_todays_checkin_count(self) -> int:
+        return self.get_dashboard_stats()["today_count"]
 
     def get_average_duration(self) -> float:
-        cached = self._cache.get("counts:avg_duration")
-        if cached is not None:
-            return cached
-        try:
-            row = self._fetchone(
-                "SELECT AVG(duration) as avgd FROM visitors WHERE duration IS NOT NULL"
-            )
-            avgd = float(row["avgd"]) if row and row["avgd"] is not None else 0.0
-            self._cache.set("counts:avg_duration", avgd)
-            return avgd
-        except sqlite3.Error:
-            logging.exception("get_average_duration failed")
-            return 0.0
+        return self.get_dashboard_stats()["avg_duration"]
 
     # -------------------------
     # LICENSE storage & retrieval
@@ -643,16 +1213,19 @@ class DatabaseManager:
         or simple log-in next time.
         """
         try:
-            with self.get_connection() as conn:
-                cur = conn.cursor()
-                cur.execute(
+            with self._txn() as conn:
+                conn.execute(
                     '''
-                    INSERT OR REPLACE INTO license (id, license_key, device_mac, is_active, activation_date)
+                    INSERT INTO license (id, license_key, device_mac, is_active, activation_date)
                     VALUES (1, ?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(id) DO UPDATE SET
+                        license_key = excluded.license_key,
+                        device_mac = excluded.device_mac,
+                        is_active = excluded.is_active,
+                        activation_date = excluded.activation_date
                     ''',
                     (license_key, device_mac, 1 if is_active else 0)
                 )
-                conn.commit()
             # invalidate cache if any license-dependent operations exist
             self._cache.invalidate()
             return True
@@ -662,33 +1235,47 @@ class DatabaseManager:
 
     def set_license_active(self, active: bool) -> bool:
         try:
-            with self.get_connection() as conn:
-                cur = conn.cursor()
-                cur.execute(
+            with self._txn() as conn:
+                conn.execute(
                     "UPDATE license SET is_active = ? WHERE id = 1",
                     (1 if active else 0,)
                 )
-                conn.commit()
             self._cache.invalidate()
             return True
         except sqlite3.Error:
             logging.exception("set_license_active failed")
             return False
 
+    def delete_license(self) -> bool:
+        try:
+            with self._txn() as conn:
+                conn.execute("DELETE FROM license WHERE id = 1")
+            self._cache.invalidate()
+            return True
+        except sqlite3.Error:
+            logging.exception("delete_license failed")
+            return False
+
     def get_license_info(self) -> Optional[Dict]:
+        # read on every privileged action; the license writers above invalidate the cache
+        cached = self._cache.get("license:info")
+        if cached is not None:
+            return cached
         try:
             row = self._fetchone(
                 "SELECT id, license_key, device_mac, activation_date, is_active FROM license WHERE id=1"
             )
             if not row:
                 return None
-            return {
+            info = {
                 "id": row["id"],
                 "license_key": row["license_key"],
                 "device_mac": row["device_mac"],
                 "activation_date": row["activation_date"],
                 "is_active": bool(row["is_active"]),
             }
+            self._cache.set("license:info", info)
+            return info
         except sqlite3.Error:
             logging.exception("get_license_info failed")
             return None
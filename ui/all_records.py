@@ -123,14 +123,13 @@ class AllRecordsWidget(QWidget):
 
     def refresh_data(self, start_date=None, end_date=None, organization=None, hp_no=None, person_visited=None):
         try:
-            records = self.db_manager.get_all_records(start_date, end_date)
-
-            if organization:
-                records = [r for r in records if organization.lower() in (r.get('company', '').lower())]
-            if hp_no:
-                records = [r for r in records if hp_no in (r.get('hp_no', ''))]
-            if person_visited:
-                records = [r for r in records if person_visited.lower() in (r.get('person_visited', '').lower())]
+            # text filters are applied by SQLite inside the date range
+            records = self.db_manager.get_all_records(
+                start_date, end_date,
+                organization=organization or "",
+                hp_no=hp_no or "",
+                person_visited=person_visited or ""
+            )
 
             self.filtered_records = records
             self.status_label.setText(f"Showing {len(records)} records")
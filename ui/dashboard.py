@@ -7,7 +7,7 @@ from PyQt5.QtGui import QFont
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import matplotlib.dates as mdates
-from datetime import datetime
+from datetime import datetime, date
 from typing import List, Tuple, Optional
 
 # Keep your app constants in utils.styles (as before). Example placeholders:
@@ -150,9 +150,10 @@ class DashboardWidget(QWidget):
         """Refresh data and immediately redraw UI. Defensive: handle None/empty returns.
         """
         try:
-            todays_count = self.db_manager.get_todays_checkin_count() or 0
+            stats = self.db_manager.get_dashboard_stats() or {}
+            todays_count = stats.get("today_count") or 0
             active_visitors = self.db_manager.get_active_visitors() or []
-            avg_duration = self.db_manager.get_average_duration() or 0
+            avg_duration = stats.get("avg_duration") or 0
         except Exception as e:
             # In production, log the exception. For now fallback to zeros which keeps UI responsive.
             todays_count = 0
@@ -179,7 +180,7 @@ class DashboardWidget(QWidget):
         self.figure.clear()
 
         try:
-            daily_data: Optional[List[Tuple[str, int]]] = self.db_manager.get_daily_checkins_current_month()
+            daily_data: Optional[List[Tuple[date, int]]] = self.db_manager.get_daily_checkins_current_month()
         except Exception:
             daily_data = None
 
@@ -201,6 +202,9 @@ class DashboardWidget(QWidget):
         def parse_date(d):
             if isinstance(d, datetime):
                 return d
+            if isinstance(d, date):
+                # DB already returns date objects; no string parsing needed
+                return datetime(d.year, d.month, d.day)
             # try several common formats; adapt to what DB returns
             for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d"):
                 try:
@@ -329,7 +329,7 @@ class MainWindow(QMainWindow):
         if info and info.get("license_key"):
             # Active?
             if info.get("is_active"):
-                if self.license_manager.is_licensed():
+                if self.license_manager.is_licensed(info):
                     # Require org setup if missing
                     cfg = load_config()
                     if not cfg.get("organization_name"):
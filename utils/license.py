@@ -2,10 +2,39 @@ import uuid
 import hashlib
 import base64
 import logging
+from functools import lru_cache
 from datetime import datetime, time
 from cryptography.fernet import Fernet
 
 
+@lru_cache(maxsize=1)
+def _read_device_mac() -> str:
+    """MAC of this machine as AA:BB:CC:DD:EE:FF (constant for the process lifetime)."""
+    mac = ':'.join(['{:02x}'.format((uuid.getnode() >> i) & 0xff)
+                   for i in range(0, 8 * 6, 8)][::-1])
+    return mac.upper()
+
+
+@lru_cache(maxsize=32)
+def _derive_license_key(mac: str, expiry_date: str) -> str:
+    # sha256 of "<mac>_<expiry>_MNEO_VMS", fed in parts (no intermediate string)
+    h = hashlib.sha256(mac.encode())
+    h.update(b"_")
+    h.update(expiry_date.encode())
+    h.update(b"_MNEO_VMS")
+    hash_hex = h.hexdigest()
+    # Format into xxxx-xxxx-xxxx-xxxx (first 16 chars of hash)
+    return "-".join([hash_hex[i:i+4].upper() for i in range(0, 16, 4)])
+
+
+@lru_cache(maxsize=4)
+def _fernet_for_mac(mac: str) -> Fernet:
+    h = hashlib.sha256(b"MNEO_VMS_SALT_")
+    h.update(mac.encode())
+    key = h.digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
 class LicenseManager:
     def __init__(self, db_manager=None):
         self.db_manager = db_manager
@@ -15,9 +44,7 @@ class LicenseManager:
     # --------------------
     def get_device_mac(self) -> str:
         try:
-            mac = ':'.join(['{:02x}'.format((uuid.getnode() >> i) & 0xff)
-                           for i in range(0, 8 * 6, 8)][::-1])
-            return mac.upper()
+            return _read_device_mac()
         except Exception as e:
             logging.error(f"Error getting MAC address: {e}")
             return "UNKNOWN"
@@ -30,10 +57,7 @@ class LicenseManager:
         Generate encryption key derived from MAC so that
         database copied to another system becomes invalid.
         """
-        mac = self.get_device_mac()
-        base = f"MNEO_VMS_SALT_{mac}"
-        key = hashlib.sha256(base.encode()).digest()
-        return Fernet(base64.urlsafe_b64encode(key))
+        return _fernet_for_mac(self.get_device_mac())
 
     def encrypt(self, text: str) -> str:
         cipher = self._get_encryption_key()
@@ -51,11 +75,7 @@ class LicenseManager:
         MAC + expiry date (YYYY-MM-DD)
         MUST match the admin-generated key.
         """
-        base_string = f"{mac}_{expiry_date}_MNEO_VMS"
-        hash_hex = hashlib.sha256(base_string.encode()).hexdigest()
-        # Format into xxxx-xxxx-xxxx-xxxx (first 16 chars of hash)
-        key = "-".join([hash_hex[i:i+4].upper() for i in range(0, 16, 4)])
-        return key
+        return _derive_license_key(mac, expiry_date)
 
     def validate_license(self, input_key: str, expiry_date: str) -> bool:
         mac = self.get_device_mac()
@@ -65,12 +85,17 @@ class LicenseManager:
     # --------------------
     # CHECK LICENSE
     # --------------------
-    def is_licensed(self) -> bool:
-        """Check DB if license exists, active and is still valid."""
+    def is_licensed(self, info: dict = None) -> bool:
+        """
+        Check DB if license exists, active and is still valid.
+        Callers that already fetched the license row can pass it as `info`
+        to avoid a second lookup.
+        """
         if not self.db_manager:
             return False
 
-        info = self.db_manager.get_license_info()
+        if info is None:
+            info = self.db_manager.get_license_info()
         if not info or not info.get("license_key"):
             return False
 
@@ -106,9 +131,26 @@ class LicenseManager:
             return False
 
         combo = f"{input_key}|{expiry_date}"
+        if self.is_already_active(combo):
+            # Same key already stored and active: skip re-encryption and the DB write
+            return True
+
         encrypted = self.encrypt(combo)
         return self.db_manager.save_license(encrypted, self.get_device_mac(), is_active=True)
 
+    def is_already_active(self, combo: str) -> bool:
+        """True if the DB already holds this exact <key>|<expiry> as the active license."""
+        if not self.db_manager:
+            return False
+        info = self.db_manager.get_license_info()
+        if not info or not info.get("license_key") or not info.get("is_active"):
+            return False
+        try:
+            # decryption only succeeds on the device the license was stored on
+            return self.decrypt(info["license_key"]) == combo
+        except Exception:
+            return False
+
     # --------------------
     # LOGIN (after logout) — only key is requested
     # --------------------
@@ -162,10 +204,6 @@ class LicenseManager:
     # --------------------
     def revoke_license(self) -> bool:
         try:
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM license WHERE id = 1")
-                conn.commit()
-            return True
+            return self.db_manager.delete_license()
         except:
             return False